@@ -1,9 +1,11 @@
-from flask import Flask, render_template, request, redirect, url_for, flash, abort
+from flask import Flask, render_template, request, redirect, url_for, flash, abort, jsonify, current_app
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import LoginManager, UserMixin, login_user, logout_user, current_user, login_required
 from flask_mail import Mail
 from flask_migrate import Migrate
 from config import Config
+from fx import FxRateCache
+from categorizer import CategorizerCache
 from werkzeug.security import generate_password_hash, check_password_hash
 from werkzeug.utils import secure_filename
 from sqlalchemy import func
@@ -11,6 +13,7 @@ from flask_wtf import FlaskForm
 from wtforms import StringField, PasswordField, BooleanField, SubmitField, FloatField, SelectField, DateField, FileField
 from wtforms.validators import DataRequired, Email, EqualTo, Length
 from datetime import datetime
+import click
 import os
 
 
@@ -32,6 +35,7 @@ class RegistrationForm(FlaskForm):
 
 class TransactionForm(FlaskForm):
     amount = FloatField('金额', validators=[DataRequired()])
+    currency = SelectField('币种', choices=[])
     description = StringField('描述')
     type = SelectField('类型', choices=[('income', '收入'), ('expense', '支出')])
     category = SelectField('分类')
@@ -67,6 +71,8 @@ class ProfileForm(FlaskForm):
 
 # 数据库模型
 db = SQLAlchemy()
+fx_rates = FxRateCache()
+categorizer = CategorizerCache()
 
 
 class User(db.Model, UserMixin):
@@ -110,14 +116,41 @@ class Transaction(db.Model):
     __tablename__ = 'transactions'
     id = db.Column(db.Integer, primary_key=True)
     amount = db.Column(db.Float, nullable=False)
+    currency = db.Column(db.String(3), nullable=False, default=Config.BASE_CURRENCY,
+                         server_default=Config.BASE_CURRENCY)
     description = db.Column(db.String(200))
     type = db.Column(db.String(10), nullable=False)  # 收入/支出
     category = db.Column(db.String(50), nullable=False)
     date = db.Column(db.DateTime, index=True, nullable=False, default=datetime.utcnow)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
 
+    @staticmethod
+    def base_totals(*criteria, keys=()):
+        """按 keys 分组汇总折算为本位币的金额
+
+        数据库内先按 分组键+币种+日期 聚合，再用内存汇率表逐组折算，
+        汇率查询次数只与分组数有关，与交易行数无关。
+        返回 ({分组键元组: 金额}, 缺少汇率未计入的笔数)。
+        """
+        fx_rates = current_app.extensions['fx_rates']
+        day = func.date(Transaction.date, type_=db.Date)
+        rows = db.session.query(*keys, Transaction.currency, day,
+                                func.sum(Transaction.amount), func.count(Transaction.id)) \
+            .filter(*criteria).group_by(*keys, Transaction.currency, day).all()
+
+        totals = {}
+        missing = 0
+        for *key, currency, on, amount, count in rows:
+            rate = fx_rates.rate(currency, on)
+            if rate is None:
+                missing += count
+                continue
+            key = tuple(key)
+            totals[key] = totals.get(key, 0) + amount * rate
+        return totals, missing
+
     def __repr__(self):
-        return f'<Transaction {self.amount} {self.type}>'
+        return f'<Transaction {self.amount} {self.currency} {self.type}>'
 
 
 class Budget(db.Model):
@@ -132,16 +165,28 @@ class Budget(db.Model):
     end_date = db.Column(db.DateTime, nullable=False)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
 
+    _spending = None
+
+    def spending(self):
+        """已花费金额（本位币）与缺少汇率未计入的笔数，同一实例只查询一次"""
+        if self._spending is None:
+            totals, missing = Transaction.base_totals(
+                Transaction.user_id == self.user_id,
+                Transaction.type == 'expense',
+                Transaction.category == self.category,
+                Transaction.date >= self.start_date,
+                Transaction.date <= self.end_date
+            )
+            self._spending = (round(totals.get((), 0), 2), missing)
+        return self._spending
+
     def spent_amount(self):
-        """计算已花费金额"""
-        from sqlalchemy import func
-        return db.session.query(func.sum(Transaction.amount)).filter(
-            Transaction.user_id == self.user_id,
-            Transaction.type == 'expense',
-            Transaction.category == self.category,
-            Transaction.date >= self.start_date,
-            Transaction.date <= self.end_date
-        ).scalar() or 0
+        """计算已花费金额（折算为本位币）"""
+        return self.spending()[0]
+
+    def unconverted_count(self):
+        """缺少汇率而未计入已花费金额的交易笔数"""
+        return self.spending()[1]
 
     def remaining_amount(self):
         """计算剩余金额"""
@@ -191,9 +236,14 @@ class Knowledge(db.Model):
 def create_app(config_class=Config):
     app = Flask(__name__)
     app.config.from_object(config_class)
+    # 本位币同时是交易币种列的数据库默认值，不能按应用单独覆盖
+    if app.config['BASE_CURRENCY'] != Config.BASE_CURRENCY:
+        raise ValueError('BASE_CURRENCY 必须通过环境变量设置，以与数据库默认币种一致')
 
     # 初始化扩展
     db.init_app(app)
+    fx_rates.init_app(app)
+    categorizer.init_app(app)
     login_manager = LoginManager(app)
     login_manager.login_view = 'login'
     mail = Mail(app)
@@ -218,6 +268,7 @@ def create_app(config_class=Config):
     def inject_vars():
         return dict(
             categories=app.config['CATEGORIES'],
+            base_currency=app.config['BASE_CURRENCY'],
             budget_periods=app.config['BUDGET_PERIODS'],
             app_name=app.config['APP_NAME']
         )
@@ -227,6 +278,38 @@ def create_app(config_class=Config):
         return '.' in filename and \
                filename.rsplit('.', 1)[1].lower() in app.config['ALLOWED_EXTENSIONS']
 
+    def currency_choices():
+        return [(c, c) for c in app.config['CURRENCIES']]
+
+    def user_categorizer(user_id):
+        def training_pairs():
+            return db.session.query(Transaction.description, Transaction.category).filter(
+                Transaction.user_id == user_id,
+                Transaction.category != app.config['UNCATEGORIZED']
+            ).all()
+        return categorizer.get(user_id, training_pairs)
+
+    # 命令行：批量补全未分类交易
+    @app.cli.command('categorize-transactions')
+    def categorize_transactions():
+        user_ids = [uid for uid, in db.session.query(Transaction.user_id).filter(
+            Transaction.category == app.config['UNCATEGORIZED']).distinct()]
+        total = 0
+        for user_id in user_ids:
+            rows = db.session.query(Transaction.id, Transaction.description).filter(
+                Transaction.user_id == user_id,
+                Transaction.category == app.config['UNCATEGORIZED']
+            ).all()
+            model = user_categorizer(user_id)
+            predicted = categorizer.categorize(model, [d for _, d in rows])
+            mappings = [dict(id=tid, category=c) for (tid, _), c in zip(rows, predicted) if c]
+            db.session.bulk_update_mappings(Transaction, mappings)
+            db.session.commit()
+            # 新写入的分类未被模型学习，丢弃旧模型以便按最新数据重新训练
+            categorizer.invalidate(user_id)
+            total += len(mappings)
+        click.echo(f'已自动分类 {total} 条交易')
+
     # 认证路由
     @app.route('/login', methods=['GET', 'POST'])
     def login():
@@ -343,31 +426,39 @@ def create_app(config_class=Config):
     @app.route('/transactions/add', methods=['GET', 'POST'])
     @login_required
     def add_transaction():
-        form = TransactionForm()
+        form = TransactionForm(currency=app.config['BASE_CURRENCY'])
+        form.currency.choices = currency_choices()
         form.goal.choices = [(g.id, g.name) for g in Goal.query.filter_by(user_id=current_user.id).all()]
 
         if form.validate_on_submit():
             transaction = Transaction(
                 amount=form.amount.data,
+                currency=form.currency.data,
                 description=form.description.data,
                 type=form.type.data,
                 category=form.category.data,
                 date=datetime.strptime(form.date.data, '%Y-%m-%d'),
                 user_id=current_user.id
             )
-            db.session.add(transaction)
 
-            # 更新目标进度
+            # 更新目标进度（目标金额以本位币计）
             if form.goal.data:
                 goal = Goal.query.get(form.goal.data)
                 if goal and goal.user_id == current_user.id:
+                    amount = fx_rates.convert(transaction.amount, transaction.currency, transaction.date)
+                    if amount is None:
+                        flash(f'缺少 {transaction.currency} 在该日期的汇率，无法更新目标进度', 'danger')
+                        return render_template('transactions/add_edit.html', form=form, title='添加交易')
                     if form.type.data == 'income':
-                        goal.current_amount += form.amount.data
+                        goal.current_amount += amount
                     else:
-                        goal.current_amount -= form.amount.data
+                        goal.current_amount -= amount
                     db.session.add(goal)
 
+            db.session.add(transaction)
+
             db.session.commit()
+            categorizer.update(current_user.id, new=(transaction.description, transaction.category))
             flash('交易已添加', 'success')
             return redirect(url_for('transactions'))
         return render_template('transactions/add_edit.html', form=form, title='添加交易')
@@ -380,10 +471,13 @@ def create_app(config_class=Config):
             abort(403)
 
         form = TransactionForm(obj=transaction)
+        form.currency.choices = currency_choices()
         form.goal.choices = [(g.id, g.name) for g in Goal.query.filter_by(user_id=current_user.id).all()]
 
         if form.validate_on_submit():
+            old = (transaction.description, transaction.category)
             transaction.amount = form.amount.data
+            transaction.currency = form.currency.data
             transaction.description = form.description.data
             transaction.type = form.type.data
             transaction.category = form.category.data
@@ -392,6 +486,9 @@ def create_app(config_class=Config):
             # 这里可以添加目标更新逻辑
 
             db.session.commit()
+            new = (transaction.description, transaction.category)
+            if new != old:
+                categorizer.update(current_user.id, new=new, old=old)
             flash('交易已更新', 'success')
             return redirect(url_for('transactions'))
         return render_template('transactions/add_edit.html', form=form, title='编辑交易')
@@ -403,11 +500,19 @@ def create_app(config_class=Config):
         if transaction.user_id != current_user.id:
             abort(403)
 
+        old = (transaction.description, transaction.category)
         db.session.delete(transaction)
         db.session.commit()
+        categorizer.update(current_user.id, old=old)
         flash('交易已删除', 'success')
         return redirect(url_for('transactions'))
 
+    @app.route('/transactions/suggest-category')
+    @login_required
+    def suggest_category():
+        model = user_categorizer(current_user.id)
+        return jsonify(category=model.predict(request.args.get('description', '')))
+
     # 预算路由
     @app.route('/budgets')
     @login_required
@@ -462,6 +567,41 @@ def create_app(config_class=Config):
             return redirect(url_for('goals'))
         return render_template('goals/add_edit.html', form=form, title='添加目标')
 
+    # 报表路由
+    @app.route('/reports')
+    @login_required
+    def reports():
+        return render_template('reports/index.html')
+
+    @app.route('/reports/data')
+    @login_required
+    def reports_data():
+        # 数据库内按日聚合，再按交易日汇率折算为本位币
+        user_filter = Transaction.user_id == current_user.id
+        expense, _ = Transaction.base_totals(
+            user_filter, Transaction.type == 'expense', keys=(Transaction.category,))
+
+        year = db.extract('year', Transaction.date)
+        month = db.extract('month', Transaction.date)
+        monthly, unconverted = Transaction.base_totals(user_filter, keys=(year, month, Transaction.type))
+        monthly = {(f'{int(y):04d}-{int(m):02d}', t): total for (y, m, t), total in monthly.items()}
+        months = sorted({m for m, _ in monthly})
+
+        return jsonify(
+            expense_by_category=dict(
+                categories=[c for c, in expense],
+                data=[round(total, 2) for total in expense.values()]
+            ),
+            monthly_data=dict(
+                months=months,
+                income=[round(monthly.get((m, 'income'), 0), 2) for m in months],
+                expense=[round(monthly.get((m, 'expense'), 0), 2) for m in months]
+            ),
+            currency=app.config['BASE_CURRENCY'],
+            # 缺少汇率的交易未计入上述金额，单独统计提示用户
+            unconverted=unconverted
+        )
+
     return app
 
 
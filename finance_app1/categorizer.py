@@ -0,0 +1,265 @@
+import math
+import os
+import pickle
+import re
+import tempfile
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
+_WORD_RE = re.compile(r'[a-z0-9]+')
+_CJK_RE = re.compile(r'[一-鿿]+')
+
+
+def tokenize(description):
+    """英文/数字按词切分，中文按单字和相邻双字切分"""
+    text = (description or '').lower()
+    tokens = set(_WORD_RE.findall(text))
+    for run in _CJK_RE.findall(text):
+        tokens.update(run)
+        tokens.update(run[i:i + 2] for i in range(len(run) - 1))
+    return tokens
+
+
+class Categorizer:
+    """单个用户的分类模型：全局关键词规则 + 朴素贝叶斯文本分类
+
+    描述命中规则关键词时，只有用户自己的历史里出现过该关键词才由个人模型判断，
+    否则采用规则；个人模型只在命中多字词且把握足够时给出结果。
+    模型自带锁，学习、撤销与预测互斥，可在多个请求线程间共享。
+    """
+
+    FORMAT_VERSION = 2  # 持久化格式版本，结构变化时递增，旧文件会被丢弃重训
+    MIN_CONFIDENCE = 0.6  # 个人模型给出结果所需的最低后验概率
+
+    def __init__(self, rules=()):
+        self.rules = list(rules)  # [(关键词, 分类)]，按顺序匹配
+        self.token_counts = {}  # {词: {分类: 次数}}
+        self.class_counts = {}  # {分类: 样本数}
+        self.class_tokens = {}  # {分类: 词总数}，始终等于 token_counts 中该分类计数之和
+        self._lock = threading.RLock()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state['_lock']
+        state['format_version'] = self.FORMAT_VERSION
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.RLock()
+
+    def fit(self, pairs):
+        """用 (描述, 分类) 对训练"""
+        with self._lock:
+            for description, category in pairs:
+                self.learn(description, category)
+        return self
+
+    def learn(self, description, category):
+        """增量学习一条样本"""
+        tokens = tokenize(description)
+        if not tokens or not category:
+            return
+        with self._lock:
+            self.class_counts[category] = self.class_counts.get(category, 0) + 1
+            self.class_tokens[category] = self.class_tokens.get(category, 0) + len(tokens)
+            for token in tokens:
+                counts = self.token_counts.setdefault(token, {})
+                counts[category] = counts.get(category, 0) + 1
+
+    def forget(self, description, category):
+        """撤销一条样本；只减去确实存在的计数，未学习过的样本不会破坏模型"""
+        tokens = tokenize(description)
+        if not tokens:
+            return
+        with self._lock:
+            if category not in self.class_counts:
+                return
+            removed = 0
+            for token in tokens:
+                counts = self.token_counts.get(token)
+                if not counts or category not in counts:
+                    continue
+                removed += 1
+                counts[category] -= 1
+                if not counts[category]:
+                    self._drop(token, category)
+            self.class_tokens[category] -= removed
+            self.class_counts[category] -= 1
+            if self.class_counts[category] <= 0:
+                # 分类已无样本，清除其残留的词计数
+                for token in [t for t, counts in self.token_counts.items() if category in counts]:
+                    self._drop(token, category)
+                del self.class_counts[category]
+                del self.class_tokens[category]
+
+    def _drop(self, token, category):
+        counts = self.token_counts[token]
+        del counts[category]
+        if not counts:
+            del self.token_counts[token]
+
+    def predict(self, description):
+        """预测分类，无法判断时返回 None"""
+        text = (description or '').lower()
+        rule = next(((keyword, category) for keyword, category in self.rules if keyword in text), None)
+        with self._lock:
+            if rule is not None and not self._knows(rule[0]):
+                return rule[1]
+            category = self._classify(text)
+        if category is None and rule is not None:
+            return rule[1]
+        return category
+
+    def _knows(self, keyword):
+        tokens = tokenize(keyword)
+        return bool(tokens) and all(t in self.token_counts for t in tokens)
+
+    def _classify(self, text):
+        if not self.class_counts:
+            return None
+        tokens = [t for t in tokenize(text) if t in self.token_counts]
+        # 单个汉字区分度太低，至少要命中一个多字词才可信
+        if not any(len(t) > 1 for t in tokens):
+            return None
+
+        # 拉普拉斯平滑：log P(t|c) = log(n_tc + 1) - log(N_c + V)，
+        # 未出现的词只贡献公共项，因此只需累加命中的稀疏计数
+        vocab = len(self.token_counts)
+        total = sum(self.class_counts.values())
+        scores = {
+            c: math.log(n / total) - len(tokens) * math.log(self.class_tokens[c] + vocab)
+            for c, n in self.class_counts.items()
+        }
+        for token in tokens:
+            for c, n in self.token_counts[token].items():
+                scores[c] += math.log(n + 1)
+        best = max(scores, key=scores.get)
+        top = scores[best]
+        confidence = 1 / sum(math.exp(score - top) for score in scores.values())
+        return best if confidence >= self.MIN_CONFIDENCE else None
+
+    def predict_many(self, descriptions):
+        """批量预测，相同描述只计算一次"""
+        memo = {}
+        results = []
+        with self._lock:
+            for description in descriptions:
+                if description not in memo:
+                    memo[description] = self.predict(description)
+                results.append(memo[description])
+        return results
+
+
+class CategorizerCache:
+    """按用户缓存分类模型（LRU淘汰），并持久化到磁盘
+
+    磁盘上只保存由数据库完整训练得到的模型；增删改交易只增量更新本进程内的模型，
+    并删除磁盘副本，其他进程冷启动时会重新训练，避免互相覆盖过期状态。
+    """
+
+    def __init__(self, app=None):
+        self._models = OrderedDict()
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.rules = list(app.config['CATEGORY_RULES'].items())
+        self.folder = app.config['CATEGORIZER_FOLDER']
+        self.cache_size = app.config['CATEGORIZER_CACHE_SIZE']
+        self.workers = app.config['CATEGORIZER_WORKERS']
+        self.batch_threshold = app.config['CATEGORIZER_BATCH_THRESHOLD']
+        self._models.clear()
+        app.extensions['categorizer'] = self
+
+    def get(self, user_id, load_pairs):
+        """获取用户模型：内存 -> 磁盘 -> 用 load_pairs() 返回的样本训练"""
+        with self._lock:
+            model = self._models.get(user_id)
+            if model is not None:
+                self._models.move_to_end(user_id)
+                return model
+
+        model = self._load(user_id)
+        if model is None:
+            model = Categorizer(self.rules).fit(load_pairs())
+            self._save(user_id, model)
+        model.rules = self.rules  # 全局规则以当前配置为准
+        self._put(user_id, model)
+        return model
+
+    def update(self, user_id, new=None, old=None):
+        """用户增删改交易后增量更新模型，new/old 为修改后/前的 (描述, 分类)"""
+        with self._lock:
+            model = self._models.get(user_id)
+        if model is not None:
+            with model._lock:
+                if old is not None:
+                    model.forget(*old)
+                if new is not None:
+                    model.learn(*new)
+        self._remove_file(user_id)
+
+    def invalidate(self, user_id):
+        """丢弃内存与磁盘上的模型，下次使用时重新训练"""
+        with self._lock:
+            self._models.pop(user_id, None)
+        self._remove_file(user_id)
+
+    def categorize(self, model, descriptions):
+        """批量分类，数据量大时分片交给进程池并行处理"""
+        unique = list(dict.fromkeys(descriptions))
+        if len(unique) < self.batch_threshold or self.workers <= 1:
+            predicted = model.predict_many(unique)
+        else:
+            size = math.ceil(len(unique) / self.workers)
+            chunks = [unique[i:i + size] for i in range(0, len(unique), size)]
+            with ProcessPoolExecutor(max_workers=self.workers) as executor:
+                predicted = [c for part in executor.map(model.predict_many, chunks) for c in part]
+        lookup = dict(zip(unique, predicted))
+        return [lookup[d] for d in descriptions]
+
+    def _put(self, user_id, model):
+        with self._lock:
+            self._models[user_id] = model
+            self._models.move_to_end(user_id)
+            while len(self._models) > self.cache_size:
+                self._models.popitem(last=False)
+
+    def _path(self, user_id):
+        return os.path.join(self.folder, f'user_{user_id}.pkl')
+
+    def _load(self, user_id):
+        path = self._path(user_id)
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, 'rb') as f:
+                model = pickle.load(f)
+            if not isinstance(model, Categorizer) or \
+                    getattr(model, 'format_version', None) != Categorizer.FORMAT_VERSION:
+                raise ValueError('模型格式版本不匹配')
+        except Exception:
+            # 文件损坏或来自旧版本，删除后重新训练
+            self._remove_file(user_id)
+            return None
+        return model
+
+    def _remove_file(self, user_id):
+        try:
+            os.remove(self._path(user_id))
+        except FileNotFoundError:
+            pass
+
+    def _save(self, user_id, model):
+        os.makedirs(self.folder, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=self.folder, prefix=f'user_{user_id}.', suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f, model._lock:
+                pickle.dump(model, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, self._path(user_id))
+        except BaseException:
+            os.remove(tmp)
+            raise
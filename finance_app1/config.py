@@ -44,4 +44,25 @@ class Config:
     ]
     
     # 预算周期选项
-    BUDGET_PERIODS = ['月度', '季度', '年度']
\ No newline at end of file
+    BUDGET_PERIODS = ['月度', '季度', '年度']
+
+    # 币种与汇率设置
+    BASE_CURRENCY = os.environ.get('BASE_CURRENCY', 'CNY')  # 本位币，预算、目标与报表均以此计
+    CURRENCIES = ['CNY', 'USD', 'EUR', 'JPY', 'HKD', 'GBP']
+    FX_RATES_FOLDER = os.path.join(basedir, 'fx_rates')  # 每日汇率CSV快照目录
+
+    # 自动分类设置
+    UNCATEGORIZED = ''  # 导入数据缺少分类时的占位值
+    CATEGORY_RULES = {  # 全局关键词规则，个人模型无法判断时使用
+        '工资': '工资', 'salary': '工资', 'payroll': '工资',
+        '奖金': '奖金', 'bonus': '奖金',
+        '房租': '住房', '物业': '住房',
+        '地铁': '交通', '公交': '交通', '滴滴': '交通', '加油': '交通',
+        '医院': '医疗', '药房': '医疗',
+        '学费': '教育',
+        '基金': '投资', '股票': '投资',
+    }
+    CATEGORIZER_FOLDER = os.path.join(basedir, 'categorizer_models')  # 用户模型持久化目录
+    CATEGORIZER_CACHE_SIZE = 256  # 内存中缓存的用户模型数
+    CATEGORIZER_WORKERS = os.cpu_count() or 1
+    CATEGORIZER_BATCH_THRESHOLD = 20000  # 去重后描述数超过该值时使用进程池
\ No newline at end of file
@@ -18,6 +18,7 @@ class RegistrationForm(FlaskForm):
 
 class TransactionForm(FlaskForm):
     amount = FloatField('金额', validators=[DataRequired()])
+    currency = SelectField('币种', choices=[])
     description = StringField('描述')
     type = SelectField('类型', choices=[('income', '收入'), ('expense', '支出')])
     category = SelectField('分类')
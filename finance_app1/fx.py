@@ -0,0 +1,85 @@
+import csv
+import os
+from bisect import bisect_right
+from datetime import datetime
+
+
+class FxRateCache:
+    """按日期索引的内存汇率表
+
+    汇率来自本地CSV快照目录，支持两种格式：
+      - 每日快照文件 YYYY-MM-DD.csv，列为 currency,rate
+      - 汇总文件，列为 date,currency,rate
+    rate 表示 1 单位外币折合多少本位币；某日无快照时沿用此前最近一次的汇率。
+    预算、报表与目标进度都只从这里取汇率，快照更新后重启应用即可生效。
+    """
+
+    def __init__(self, app=None):
+        self.base_currency = None
+        self._dates = {}  # {币种: 升序日期列表}
+        self._rates = {}  # {币种: 与日期一一对应的汇率列表}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.base_currency = app.config['BASE_CURRENCY']
+        folder = app.config['FX_RATES_FOLDER']
+        if os.path.isdir(folder):
+            for problem in self.load(folder):
+                app.logger.warning('跳过无效汇率数据：%s', problem)
+        app.extensions['fx_rates'] = self
+
+    def load(self, folder):
+        """加载目录下所有CSV快照，跳过无效的行或文件，返回问题描述列表"""
+        raw = {}
+        problems = []
+        for filename in sorted(os.listdir(folder)):
+            if not filename.lower().endswith('.csv'):
+                continue
+            snapshot_date = _parse_date(os.path.splitext(filename)[0])
+            try:
+                with open(os.path.join(folder, filename), newline='', encoding='utf-8') as f:
+                    for line, row in enumerate(csv.DictReader(f), start=2):
+                        try:
+                            day = _parse_date(row['date']) if row.get('date') else snapshot_date
+                            currency = row['currency'].strip().upper()
+                            rate = float(row['rate'])
+                            if day is None or not currency or not rate > 0:
+                                raise ValueError('日期、币种或汇率无效')
+                        except (KeyError, ValueError, TypeError, AttributeError) as e:
+                            problems.append(f'{filename} 第 {line} 行：{e!r}')
+                            continue
+                        raw.setdefault(currency, {})[day] = rate
+            except (OSError, UnicodeDecodeError, csv.Error) as e:
+                problems.append(f'{filename}：{e!r}')
+
+        raw.pop(self.base_currency, None)
+        self._dates = {currency: sorted(rates) for currency, rates in raw.items()}
+        self._rates = {currency: [raw[currency][d] for d in days] for currency, days in self._dates.items()}
+        return problems
+
+    def currencies(self):
+        """已加载汇率的币种（含本位币）"""
+        return sorted(set(self._rates) | {self.base_currency})
+
+    def rate(self, currency, day):
+        """查询某币种在某日或之前最近的汇率，无汇率时返回 None"""
+        if currency == self.base_currency:
+            return 1.0
+        if isinstance(day, datetime):
+            day = day.date()
+        i = bisect_right(self._dates.get(currency, ()), day)
+        return self._rates[currency][i - 1] if i else None
+
+    def convert(self, amount, currency, day):
+        """将金额折算为本位币，无汇率时返回 None"""
+        rate = self.rate(currency, day)
+        return amount * rate if rate is not None else None
+
+
+def _parse_date(value):
+    try:
+        return datetime.strptime(value.strip(), '%Y-%m-%d').date()
+    except (ValueError, AttributeError):
+        return None
+
@@ -1,7 +1,10 @@
 from datetime import datetime
+from flask import current_app
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import UserMixin
 from werkzeug.security import generate_password_hash, check_password_hash
+from sqlalchemy import func
+from config import Config
 
 db = SQLAlchemy()
 
@@ -44,14 +47,41 @@ class Transaction(db.Model):
     __tablename__ = 'transactions'
     id = db.Column(db.Integer, primary_key=True)
     amount = db.Column(db.Float, nullable=False)
+    currency = db.Column(db.String(3), nullable=False, default=Config.BASE_CURRENCY,
+                         server_default=Config.BASE_CURRENCY)
     description = db.Column(db.String(200))
     type = db.Column(db.String(10), nullable=False)  # 收入/支出
     category = db.Column(db.String(50), nullable=False)
     date = db.Column(db.DateTime, index=True, nullable=False, default=datetime.utcnow)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     
+    @staticmethod
+    def base_totals(*criteria, keys=()):
+        """按 keys 分组汇总折算为本位币的金额
+
+        数据库内先按 分组键+币种+日期 聚合，再用内存汇率表逐组折算，
+        汇率查询次数只与分组数有关，与交易行数无关。
+        返回 ({分组键元组: 金额}, 缺少汇率未计入的笔数)。
+        """
+        fx_rates = current_app.extensions['fx_rates']
+        day = func.date(Transaction.date, type_=db.Date)
+        rows = db.session.query(*keys, Transaction.currency, day,
+                                func.sum(Transaction.amount), func.count(Transaction.id)) \
+            .filter(*criteria).group_by(*keys, Transaction.currency, day).all()
+
+        totals = {}
+        missing = 0
+        for *key, currency, on, amount, count in rows:
+            rate = fx_rates.rate(currency, on)
+            if rate is None:
+                missing += count
+                continue
+            key = tuple(key)
+            totals[key] = totals.get(key, 0) + amount * rate
+        return totals, missing
+    
     def __repr__(self):
-        return f'<Transaction {self.amount} {self.type}>'
+        return f'<Transaction {self.amount} {self.currency} {self.type}>'
 
 class Budget(db.Model):
     """预算模型"""
@@ -65,16 +95,28 @@ class Budget(db.Model):
     end_date = db.Column(db.DateTime, nullable=False)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     
+    _spending = None
+    
+    def spending(self):
+        """已花费金额（本位币）与缺少汇率未计入的笔数，同一实例只查询一次"""
+        if self._spending is None:
+            totals, missing = Transaction.base_totals(
+                Transaction.user_id == self.user_id,
+                Transaction.type == 'expense',
+                Transaction.category == self.category,
+                Transaction.date >= self.start_date,
+                Transaction.date <= self.end_date
+            )
+            self._spending = (round(totals.get((), 0), 2), missing)
+        return self._spending
+    
     def spent_amount(self):
-        """计算已花费金额"""
-        from sqlalchemy import func
-        return db.session.query(func.sum(Transaction.amount)).filter(
-            Transaction.user_id == self.user_id,
-            Transaction.type == 'expense',
-            Transaction.category == self.category,
-            Transaction.date >= self.start_date,
-            Transaction.date <= self.end_date
-        ).scalar() or 0
+        """计算已花费金额（折算为本位币）"""
+        return self.spending()[0]
+    
+    def unconverted_count(self):
+        """缺少汇率而未计入已花费金额的交易笔数"""
+        return self.spending()[1]
     
     def remaining_amount(self):
         """计算剩余金额"""
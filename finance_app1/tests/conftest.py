@@ -0,0 +1,35 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app import create_app, db  # noqa: E402
+from config import Config  # noqa: E402
+
+
+@pytest.fixture
+def rates_folder(tmp_path):
+    folder = tmp_path / 'fx_rates'
+    folder.mkdir()
+    (folder / '2026-01-01.csv').write_text('currency,rate\nUSD,7.0\nEUR,8.0\n', encoding='utf-8')
+    (folder / 'history.csv').write_text('date,currency,rate\n2026-03-01,USD,7.2\n', encoding='utf-8')
+    return folder
+
+
+@pytest.fixture
+def app(tmp_path, rates_folder):
+    class TestConfig(Config):
+        TESTING = True
+        SQLALCHEMY_DATABASE_URI = 'sqlite://'
+        WTF_CSRF_ENABLED = False
+        FX_RATES_FOLDER = str(rates_folder)
+        CATEGORIZER_FOLDER = str(tmp_path / 'categorizer_models')
+
+    app = create_app(TestConfig)
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.drop_all()
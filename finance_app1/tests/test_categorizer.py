@@ -0,0 +1,232 @@
+import pickle
+import threading
+
+from categorizer import Categorizer, CategorizerCache, tokenize
+from config import Config
+
+PAIRS = [
+    ('星巴克 咖啡 上海店', '餐饮'),
+    ('麦当劳 午餐', '餐饮'),
+    ('滴滴出行 快车', '交通'),
+    ('地铁 充值', '交通'),
+    ('淘宝 订单', '购物'),
+]
+
+
+def _cache(tmp_path, **overrides):
+    class App:
+        config = dict(CATEGORY_RULES={'加油': '交通', '房租': '住房'},
+                      CATEGORIZER_FOLDER=str(tmp_path / 'models'),
+                      CATEGORIZER_CACHE_SIZE=2,
+                      CATEGORIZER_WORKERS=1,
+                      CATEGORIZER_BATCH_THRESHOLD=20000)
+        extensions = {}
+    App.config.update(overrides)
+    return CategorizerCache(App())
+
+
+def _consistent(model):
+    for category, total in model.class_tokens.items():
+        assert total == sum(c.get(category, 0) for c in model.token_counts.values())
+    assert set(model.class_tokens) == set(model.class_counts)
+    for counts in model.token_counts.values():
+        assert counts and set(counts) <= set(model.class_counts)
+
+
+def test_tokenize_mixes_words_and_cjk_bigrams():
+    assert tokenize('Amazon 咖啡店') == {'amazon', '咖', '啡', '店', '咖啡', '啡店'}
+
+
+def test_predict_uses_user_history():
+    model = Categorizer().fit(PAIRS)
+    assert model.predict('星巴克') == '餐饮'
+    assert model.predict('滴滴 专车') == '交通'
+    assert model.predict('xyz') is None
+
+
+def test_user_labels_take_precedence_over_rules():
+    model = Categorizer([('加油', '交通')]).fit([('加油站便利店 零食', '购物')])
+    assert model.predict('加油站便利店') == '购物'
+    assert model.predict('中石化加油') == '购物'
+    assert Categorizer([('加油', '交通')]).predict('中石化加油') == '交通'
+
+
+def test_config_rules_beat_weak_personal_matches():
+    model = Categorizer(Config.CATEGORY_RULES.items()).fit(PAIRS)
+    assert model.predict('六月工资 上海') == '工资'
+    assert model.predict('上海 房租') == '住房'
+    assert model.predict('医院 挂号费 店') == '医疗'
+    assert model.predict('星巴克 上海') == '餐饮'
+
+
+def test_single_character_matches_are_not_enough():
+    model = Categorizer().fit(PAIRS)
+    assert model.predict('上 店') is None
+    assert model.predict('午') is None
+
+
+def test_low_confidence_returns_none():
+    model = Categorizer().fit([('超市 日用', '购物'), ('超市 水果', '餐饮')])
+    assert model.predict('超市') is None
+    assert model.predict('超市 水果') == '餐饮'
+
+
+def test_rules_apply_when_model_has_no_matching_tokens():
+    model = Categorizer([('房租', '住房')]).fit([('星巴克', '餐饮')])
+    assert model.predict('六月房租') == '住房'
+
+
+def test_forget_unseen_sample_keeps_model_consistent():
+    model = Categorizer().fit([('星巴克 咖啡', '餐饮')])
+    model.forget('麦当劳 汉堡 咖啡', '餐饮')
+    _consistent(model)
+    assert model.predict('咖啡') is None
+
+    model = Categorizer().fit(PAIRS)
+    model.forget('麦当劳 汉堡', '餐饮')
+    model.forget('房租', '住房')
+    _consistent(model)
+    assert model.predict('咖啡') == '餐饮'
+
+
+def test_forget_reverts_learn():
+    model = Categorizer().fit(PAIRS)
+    model.learn('星巴克 咖啡', '购物')
+    model.forget('星巴克 咖啡', '购物')
+    _consistent(model)
+    assert model.class_counts['购物'] == 1
+    assert model.predict('星巴克') == '餐饮'
+
+
+def test_concurrent_learn_and_predict():
+    model = Categorizer().fit(PAIRS)
+    errors = []
+    stop = threading.Event()
+
+    def mutate():
+        for i in range(3000):
+            model.learn(f'新店 {i}', '其他支出')
+            model.forget(f'新店 {i}', '其他支出')
+        stop.set()
+
+    def read():
+        try:
+            while not stop.is_set():
+                model.predict('新店 咖啡')
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=mutate)] + [threading.Thread(target=read) for _ in range(2)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert not errors
+    _consistent(model)
+
+
+class CountingCategorizer(Categorizer):
+    calls = 0
+
+    def predict(self, description):
+        CountingCategorizer.calls += 1
+        return super().predict(description)
+
+
+def test_categorize_deduplicates_descriptions(tmp_path):
+    cache = _cache(tmp_path)
+    model = CountingCategorizer().fit(PAIRS)
+    CountingCategorizer.calls = 0
+    descriptions = ['星巴克', '地铁', '星巴克', 'xyz', '地铁'] * 100
+    result = cache.categorize(model, descriptions)
+    assert CountingCategorizer.calls == 3
+    assert result[:5] == ['餐饮', '交通', '餐饮', None, '交通']
+    assert len(result) == len(descriptions)
+
+
+def test_categorize_worker_pool_matches_serial(tmp_path):
+    model = Categorizer().fit(PAIRS)
+    descriptions = [f'星巴克 {i}' if i % 3 else f'滴滴 {i}' for i in range(200)]
+    serial = _cache(tmp_path).categorize(model, descriptions)
+    pooled = _cache(tmp_path, CATEGORIZER_WORKERS=2, CATEGORIZER_BATCH_THRESHOLD=10).categorize(model, descriptions)
+    assert pooled == serial
+
+
+def test_cache_persists_trained_models_and_evicts_lru(tmp_path):
+    cache = _cache(tmp_path)
+    loads = []
+
+    def pairs():
+        loads.append(1)
+        return PAIRS
+
+    model = cache.get(1, pairs)
+    assert cache.get(1, pairs) is model
+    cache.get(2, pairs)
+    cache.get(3, pairs)
+    assert list(cache._models) == [2, 3]
+
+    # 已淘汰的模型从磁盘恢复，无需重新训练
+    restored = cache.get(1, pairs)
+    assert len(loads) == 3
+    assert restored.predict('星巴克') == '餐饮'
+
+
+def test_corrupt_or_outdated_model_file_is_retrained(tmp_path, monkeypatch):
+    cache = _cache(tmp_path)
+    folder = tmp_path / 'models'
+    folder.mkdir()
+    (folder / 'user_1.pkl').write_bytes(b'\x80\x05truncated')
+    model = cache.get(1, lambda: PAIRS)
+    assert model.predict('星巴克') == '餐饮'
+
+    monkeypatch.setattr(Categorizer, 'FORMAT_VERSION', 1)
+    with open(folder / 'user_2.pkl', 'wb') as f:
+        pickle.dump(Categorizer().fit(PAIRS), f)
+    monkeypatch.undo()
+    loads = []
+    cache.get(2, lambda: loads.append(1) or PAIRS)
+    assert loads == [1]
+
+
+def test_update_changes_memory_and_drops_disk_copy(tmp_path):
+    cache = _cache(tmp_path)
+    model = cache.get(1, lambda: PAIRS)
+    path = tmp_path / 'models' / 'user_1.pkl'
+    assert path.exists()
+
+    cache.update(1, new=('星巴克 咖啡', '购物'), old=('未学习过的描述', '餐饮'))
+    assert not path.exists()
+    assert model.class_counts['购物'] == 2
+    _consistent(model)
+
+    cache.invalidate(1)
+    assert cache.get(1, lambda: PAIRS) is not model
+
+
+def test_categorize_transactions_command_invalidates_model(app):
+    from datetime import datetime
+
+    from app import Transaction, User, categorizer, db
+
+    user = User(username='alice', email='alice@example.com')
+    user.set_password('secret123')
+    db.session.add(user)
+    db.session.flush()
+    for description, category in PAIRS + [('星巴克 拿铁', ''), ('月租 房租', '')]:
+        db.session.add(Transaction(amount=10, description=description, type='expense',
+                                   category=category, date=datetime(2026, 1, 5), user_id=user.id))
+    db.session.commit()
+    user_id = user.id
+
+    client = app.test_client()
+    client.post('/login', data={'username': 'alice', 'password': 'secret123'})
+    assert client.get('/transactions/suggest-category?description=星巴克').get_json() == {'category': '餐饮'}
+    cached = categorizer._models[user_id]
+
+    result = app.test_cli_runner().invoke(args=['categorize-transactions'])
+    assert '已自动分类 2 条交易' in result.output
+    assert user_id not in categorizer._models
+    assert cached is not categorizer.get(user_id, lambda: [])
+    assert dict(db.session.query(Transaction.description, Transaction.category)) \
+        .items() >= {('星巴克 拿铁', '餐饮'), ('月租 房租', '住房')}
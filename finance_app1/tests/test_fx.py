@@ -0,0 +1,135 @@
+from datetime import date, datetime
+
+import pytest
+
+from app import Budget, Transaction, User, create_app, db, fx_rates
+from config import Config
+from fx import FxRateCache
+
+
+def test_rate_falls_back_to_latest_snapshot(app):
+    assert fx_rates.rate('USD', date(2026, 1, 1)) == 7.0
+    assert fx_rates.rate('USD', date(2026, 2, 15)) == 7.0
+    assert fx_rates.rate('USD', datetime(2026, 3, 1, 12)) == 7.2
+    assert fx_rates.rate('USD', date(2030, 1, 1)) == 7.2
+    assert fx_rates.rate('CNY', date(2000, 1, 1)) == 1.0
+
+
+def test_rate_missing_before_first_snapshot_or_unknown_currency(app):
+    assert fx_rates.rate('USD', date(2025, 12, 31)) is None
+    assert fx_rates.rate('JPY', date(2026, 6, 1)) is None
+    assert fx_rates.convert(10, 'JPY', date(2026, 6, 1)) is None
+    assert fx_rates.convert(10, 'EUR', date(2026, 6, 1)) == 80.0
+
+
+def test_load_skips_bad_rows_and_files(tmp_path):
+    (tmp_path / '2026-01-01.csv').write_text('currency,rate\nUSD,7.0\nEUR,\n,8.0\nGBP,abc\n', encoding='utf-8')
+    (tmp_path / '2026-01-02.csv').write_text('currency\nUSD\n', encoding='utf-8')
+    (tmp_path / 'broken.csv').write_bytes(b'\xff\xfe\x00bad')
+    cache = FxRateCache()
+    cache.base_currency = 'CNY'
+
+    problems = cache.load(str(tmp_path))
+
+    assert len(problems) == 5
+    assert cache.currencies() == ['CNY', 'USD']
+    assert cache.rate('USD', date(2026, 1, 2)) == 7.0
+
+
+def test_app_starts_with_bad_rate_file(app, rates_folder):
+    (rates_folder / '2026-04-01.csv').write_text('currency,rate\nUSD,\n', encoding='utf-8')
+
+    class BadRatesConfig(Config):
+        FX_RATES_FOLDER = str(rates_folder)
+
+    create_app(BadRatesConfig)
+    assert fx_rates.rate('USD', date(2026, 4, 2)) == 7.2
+
+
+def test_base_currency_cannot_be_overridden_per_app():
+    class OtherBase(Config):
+        BASE_CURRENCY = 'USD'
+
+    with pytest.raises(ValueError):
+        create_app(OtherBase)
+
+
+def _budget_with_transactions(amounts):
+    user = User(username='alice', email='alice@example.com')
+    db.session.add(user)
+    db.session.flush()
+    for amount, currency, day in amounts:
+        db.session.add(Transaction(amount=amount, currency=currency, type='expense', category='餐饮',
+                                   date=day, user_id=user.id))
+    budget = Budget(name='餐饮', amount=1000, category='餐饮', period='年度',
+                    start_date=datetime(2025, 1, 1), end_date=datetime(2027, 12, 31), user_id=user.id)
+    db.session.add(budget)
+    db.session.commit()
+    return budget
+
+
+def test_budget_converts_with_latest_rate_on_or_before_date(app):
+    budget = _budget_with_transactions([
+        (100, 'CNY', datetime(2026, 1, 5)),
+        (10, 'USD', datetime(2026, 1, 5)),
+        (10, 'USD', datetime(2027, 1, 5, 9, 30)),
+    ])
+    assert budget.spent_amount() == 100 + 70 + 72
+    assert budget.unconverted_count() == 0
+    assert budget.remaining_amount() == 1000 - 242
+
+
+def test_budget_spending_is_queried_once(app):
+    budget = _budget_with_transactions([(100, 'CNY', datetime(2026, 1, 5))])
+    db.session.refresh(budget)
+    queries = []
+    from sqlalchemy import event
+    listener = lambda *args: queries.append(args[2])  # noqa: E731
+    event.listen(db.engine, 'before_cursor_execute', listener)
+    try:
+        budget.spent_amount()
+        budget.remaining_amount()
+        budget.unconverted_count()
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', listener)
+    assert len(queries) == 1
+
+
+def test_budget_counts_transactions_without_rate(app):
+    budget = _budget_with_transactions([
+        (100, 'CNY', datetime(2026, 1, 5)),
+        (10, 'USD', datetime(2025, 6, 1)),
+        (10, 'JPY', datetime(2026, 6, 1)),
+    ])
+    assert budget.spent_amount() == 100
+    assert budget.unconverted_count() == 2
+
+
+def test_currency_has_server_default(app):
+    db.session.add(User(username='bob', email='bob@example.com'))
+    db.session.commit()
+    db.session.execute(
+        "INSERT INTO transactions (amount, type, category, date, user_id) "
+        "VALUES (5, 'expense', '餐饮', '2026-01-05 00:00:00', 1)"
+    )
+    assert Transaction.query.one().currency == app.config['BASE_CURRENCY']
+
+
+def test_reports_data_groups_by_month_and_reports_unconverted(app):
+    _budget_with_transactions([
+        (100, 'CNY', datetime(2026, 1, 5)),
+        (10, 'USD', datetime(2027, 1, 5)),
+        (10, 'USD', datetime(2025, 6, 1)),
+    ])
+    user = User.query.one()
+    user.set_password('secret123')
+    db.session.commit()
+
+    client = app.test_client()
+    client.post('/login', data={'username': 'alice', 'password': 'secret123'})
+    data = client.get('/reports/data').get_json()
+
+    assert data['monthly_data']['months'] == ['2026-01', '2027-01']
+    assert data['monthly_data']['expense'] == [100, 72]
+    assert data['expense_by_category'] == {'categories': ['餐饮'], 'data': [172]}
+    assert data['unconverted'] == 1